@@ -1,112 +1,193 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import functools
+import glob
+import hashlib
 import json
-import threading
+import os
+import pickle
+import struct
 import time
+from array import array
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 from evdev import InputDevice, UInput, ecodes, list_devices
 
 DEFAULT_CONFIG_PATH = Path(__file__).with_name("macros.json")
+CACHE_DIR = Path.home() / ".cache" / "macro-toggle"
+
+
+def load_config(config_path: Path) -> Dict[str, Any]:
+    """
+    設定JSONを読む。(mtime, size) が一致すれば ~/.cache/macro-toggle/ の
+    pickleを使い、2回目以降の起動でJSONパースを省く。キャッシュの読み書きに
+    失敗しても普通にパースして動く。
+    """
+    st = config_path.stat()
+    key = (st.st_mtime_ns, st.st_size)
+    name = hashlib.sha1(str(config_path.resolve()).encode()).hexdigest()[:16]
+    cache_file = CACHE_DIR / f"macros.{name}.pkl"
+
+    try:
+        with open(cache_file, "rb") as f:
+            cached_key, config = pickle.load(f)
+        if cached_key == key:
+            return config
+    except (OSError, pickle.PickleError, EOFError, ValueError):
+        pass
+
+    config = json.loads(config_path.read_text(encoding="utf-8"))
+
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump((key, config), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)  # 書きかけのキャッシュを見せない
+    except OSError:
+        pass
+    return config
 
 
 # ---- hotkey parsing ( "<ctrl>+<shift>+e" ) ----
+# getattr(ecodes, f"KEY_...") をimport時に済ませておく（実行時はdict参照1回）
+_CHAR2CODE: Dict[str, int] = {
+    **{c: ecodes.__dict__[f"KEY_{c.upper()}"] for c in "abcdefghijklmnopqrstuvwxyz"},
+    **{c: ecodes.__dict__[f"KEY_{c}"] for c in "0123456789"},
+    " ": ecodes.KEY_SPACE,
+    # よく使う記号（US配列相当のキーコード）
+    "`": ecodes.KEY_GRAVE,          # `
+    "-": ecodes.KEY_MINUS,          # -
+    "=": ecodes.KEY_EQUAL,          # =
+    "[": ecodes.KEY_LEFTBRACE,      # [
+    "]": ecodes.KEY_RIGHTBRACE,     # ]
+    "\\": ecodes.KEY_BACKSLASH,     # \
+    ";": ecodes.KEY_SEMICOLON,      # ;
+    "'": ecodes.KEY_APOSTROPHE,     # '
+    ",": ecodes.KEY_COMMA,          # ,
+    ".": ecodes.KEY_DOT,            # .
+    "/": ecodes.KEY_SLASH,          # /
+}
+_FN2CODE: Dict[int, int] = {i: getattr(ecodes, f"KEY_F{i}") for i in range(1, 25)}
+
+
 def _char_to_keycode(ch: str) -> int:
-    ch = ch.lower()
-    if "a" <= ch <= "z":
-        return getattr(ecodes, f"KEY_{ch.upper()}")
-    if "0" <= ch <= "9":
-        return getattr(ecodes, f"KEY_{ch}")
-    if ch == " ":
-        return ecodes.KEY_SPACE
-
-    # 追加：よく使う記号（US配列相当のキーコード）
-    punct = {
-        "`": ecodes.KEY_GRAVE,          # `
-        "-": ecodes.KEY_MINUS,          # -
-        "=": ecodes.KEY_EQUAL,          # =
-        "[": ecodes.KEY_LEFTBRACE,      # [
-        "]": ecodes.KEY_RIGHTBRACE,     # ]
-        "\\": ecodes.KEY_BACKSLASH,     # \
-        ";": ecodes.KEY_SEMICOLON,      # ;
-        "'": ecodes.KEY_APOSTROPHE,     # '
-        ",": ecodes.KEY_COMMA,          # ,
-        ".": ecodes.KEY_DOT,            # .
-        "/": ecodes.KEY_SLASH,          # /
-    }
-    if ch in punct:
-        return punct[ch]
-
-    raise ValueError(f"Unsupported char key: {ch!r}")
-
-
-
-def parse_hotkey(spec: str) -> List[set[int]]:
+    try:
+        return _CHAR2CODE[ch.lower()]
+    except KeyError:
+        raise ValueError(f"Unsupported char key: {ch!r}") from None
+
+
+@functools.lru_cache(maxsize=64)
+def parse_hotkey(spec: str) -> tuple[frozenset[int], ...]:
     """
-    Returns list of alternative-sets.
-    Each element is a set of acceptable codes for that modifier/key.
-    Example: "<ctrl>+e" => [{KEY_LEFTCTRL,KEY_RIGHTCTRL},{KEY_E}]
+    Returns a tuple of alternative-sets.
+    Each element is a frozenset of acceptable codes for that modifier/key.
+    Example: "<ctrl>+e" => ({KEY_LEFTCTRL,KEY_RIGHTCTRL},{KEY_E})
+    結果は不変なのでspec文字列ごとにキャッシュして使い回せる。
     """
     parts = [p.strip().lower() for p in spec.split("+") if p.strip()]
-    out: List[set[int]] = []
+    out: List[frozenset[int]] = []
 
     for p in parts:
         if p in ("<ctrl>", "<control>"):
-            out.append({ecodes.KEY_LEFTCTRL, ecodes.KEY_RIGHTCTRL})
+            out.append(frozenset({ecodes.KEY_LEFTCTRL, ecodes.KEY_RIGHTCTRL}))
         elif p == "<shift>":
-            out.append({ecodes.KEY_LEFTSHIFT, ecodes.KEY_RIGHTSHIFT})
+            out.append(frozenset({ecodes.KEY_LEFTSHIFT, ecodes.KEY_RIGHTSHIFT}))
         elif p == "<alt>":
-            out.append({ecodes.KEY_LEFTALT, ecodes.KEY_RIGHTALT})
+            out.append(frozenset({ecodes.KEY_LEFTALT, ecodes.KEY_RIGHTALT}))
         elif p in ("<meta>", "<super>", "<win>"):
-            out.append({ecodes.KEY_LEFTMETA, ecodes.KEY_RIGHTMETA})
+            out.append(frozenset({ecodes.KEY_LEFTMETA, ecodes.KEY_RIGHTMETA}))
         elif p.startswith("<f") and p.endswith(">"):
-            n = int(p[2:-1])
-            out.append({getattr(ecodes, f"KEY_F{n}")})
+            code = _FN2CODE.get(int(p[2:-1]))
+            if code is None:
+                raise ValueError(f"Unsupported hotkey token: {p!r}")
+            out.append(frozenset({code}))
         elif len(p) == 1:
-            out.append({_char_to_keycode(p)})
+            out.append(frozenset({_char_to_keycode(p)}))
         else:
             raise ValueError(f"Unsupported hotkey token: {p!r}")
 
+    return tuple(out)
+
+
+def keycode_bit_lut(reqs: List[tuple[frozenset[int], ...]]) -> array:
+    """
+    trigger/quit が参照するキーコードだけに 0..N のビット番号を振ったLUTを返す。
+    未使用キーは -1。押下状態が1マシンワードのマスクに収まる。
+    """
+    lut = array("q", [-1]) * (ecodes.KEY_MAX + 1)
+    codes = sorted({c for req in reqs for alt in req for c in alt})
+    for i, c in enumerate(codes):
+        lut[c] = i
+    return lut
+
+
+def hotkey_masks(req: tuple[frozenset[int], ...], bit_of: array) -> List[int]:
+    """parse_hotkey の結果を、トークンごとの許容キー（詰めたビット位置）をORしたマスク列にする."""
+    out: List[int] = []
+    for alt in req:
+        m = 0
+        for code in alt:
+            m |= 1 << bit_of[code]
+        out.append(m)
     return out
 
 
-def hotkey_satisfied(pressed: set[int], req: List[set[int]]) -> bool:
-    return all(any(code in pressed for code in alt) for alt in req)
+def hotkey_satisfied(pressed: int, req_masks: List[int]) -> bool:
+    # pressed は押下中キーコードのビットマスク。ネストしたループもset探索も無し
+    return all(m & pressed for m in req_masks)
 
 
 # ---- macro input (uinput) ----
+# struct input_event: struct timeval + __u16 type + __u16 code + __s32 value
+# （uinputへの書き込みではタイムスタンプは無視されるので0でよい）
+_INPUT_EVENT = struct.Struct("llHHi")
+_SYN_EVENT = _INPUT_EVENT.pack(0, 0, ecodes.EV_SYN, ecodes.SYN_REPORT, 0)
+
+
+def _pack_event(etype: int, code: int, value: int) -> bytes:
+    return _INPUT_EVENT.pack(0, 0, etype, code, value)
+
+
+# Key.enter -> KEY_ENTER etc.
+_KEYNAME2CODE = {
+    "enter": ecodes.KEY_ENTER,
+    "esc": ecodes.KEY_ESC,
+    "tab": ecodes.KEY_TAB,
+    "space": ecodes.KEY_SPACE,
+    "backspace": ecodes.KEY_BACKSPACE,
+    "delete": ecodes.KEY_DELETE,
+    "up": ecodes.KEY_UP,
+    "down": ecodes.KEY_DOWN,
+    "left": ecodes.KEY_LEFT,
+    "right": ecodes.KEY_RIGHT,
+    "shift": ecodes.KEY_LEFTSHIFT,
+    "shift_l": ecodes.KEY_LEFTSHIFT,
+    "shift_r": ecodes.KEY_RIGHTSHIFT,
+    "ctrl": ecodes.KEY_LEFTCTRL,
+    "ctrl_l": ecodes.KEY_LEFTCTRL,
+    "ctrl_r": ecodes.KEY_RIGHTCTRL,
+    "alt": ecodes.KEY_LEFTALT,
+    "alt_l": ecodes.KEY_LEFTALT,
+    "alt_r": ecodes.KEY_RIGHTALT,
+}
+
+
+@functools.lru_cache(maxsize=256)
 def parse_macro_key(raw: str) -> int:
     raw = raw.strip()
     if raw.startswith("Key."):
         name = raw.split(".", 1)[1]
-        # Key.enter -> KEY_ENTER etc.
-        mapping = {
-            "enter": ecodes.KEY_ENTER,
-            "esc": ecodes.KEY_ESC,
-            "tab": ecodes.KEY_TAB,
-            "space": ecodes.KEY_SPACE,
-            "backspace": ecodes.KEY_BACKSPACE,
-            "delete": ecodes.KEY_DELETE,
-            "up": ecodes.KEY_UP,
-            "down": ecodes.KEY_DOWN,
-            "left": ecodes.KEY_LEFT,
-            "right": ecodes.KEY_RIGHT,
-            "shift": ecodes.KEY_LEFTSHIFT,
-            "shift_l": ecodes.KEY_LEFTSHIFT,
-            "shift_r": ecodes.KEY_RIGHTSHIFT,
-            "ctrl": ecodes.KEY_LEFTCTRL,
-            "ctrl_l": ecodes.KEY_LEFTCTRL,
-            "ctrl_r": ecodes.KEY_RIGHTCTRL,
-            "alt": ecodes.KEY_LEFTALT,
-            "alt_l": ecodes.KEY_LEFTALT,
-            "alt_r": ecodes.KEY_RIGHTALT,
-        }
         if name.startswith("f") and name[1:].isdigit():
-            return getattr(ecodes, f"KEY_F{int(name[1:])}")
-        if name in mapping:
-            return mapping[name]
+            code = _FN2CODE.get(int(name[1:]))
+            if code is not None:
+                return code
+        if name in _KEYNAME2CODE:
+            return _KEYNAME2CODE[name]
         raise ValueError(f"Unsupported Key.*: {raw}")
     if len(raw) == 1:
         return _char_to_keycode(raw)
@@ -114,129 +195,164 @@ def parse_macro_key(raw: str) -> int:
 
 
 class HoldState:
+    # ロックは持たない：set.add / set.discard はGIL下で単発操作としてアトミックで、
+    # release_all* はsetごと差し替える（束縛の付け替えもアトミック）ので競合しない
     def __init__(self) -> None:
-        self._lock = threading.Lock()
         self._held: set[int] = set()
 
     def mark_down(self, code: int) -> None:
-        with self._lock:
-            self._held.add(code)
+        self._held.add(code)
 
     def mark_up(self, code: int) -> None:
-        with self._lock:
-            self._held.discard(code)
+        self._held.discard(code)
 
     def release_all_return(self, ui: UInput) -> List[int]:
-        with self._lock:
-            codes = list(self._held)
-            self._held.clear()
-        for c in codes:
+        codes, self._held = list(self._held), set()
+        if codes:
             try:
-                ui.write(ecodes.EV_KEY, c, 0)
+                # 実行時に組むイベント列は結合コピーせず writev で1回で出す
+                os.writev(ui.fd, [_pack_event(ecodes.EV_KEY, c, 0) for c in codes] + [_SYN_EVENT])
             except Exception:
                 pass
-        ui.syn()
         return codes
 
     def release_all(self, ui: UInput) -> None:
-        with self._lock:
-            codes = list(self._held)
-            self._held.clear()
-        for c in codes:
+        codes, self._held = list(self._held), set()
+        if codes:
             try:
-                ui.write(ecodes.EV_KEY, c, 0)
+                # 実行時に組むイベント列は結合コピーせず writev で1回で出す
+                os.writev(ui.fd, [_pack_event(ecodes.EV_KEY, c, 0) for c in codes] + [_SYN_EVENT])
             except Exception:
                 pass
-        ui.syn()
+
+
+# ざっくり “ゲームで使いがちなキー＋マウス” を許可（import時に1回だけ組む）
+_UINPUT_KEYS = (
+    ecodes.KEY_A, ecodes.KEY_B, ecodes.KEY_C, ecodes.KEY_D, ecodes.KEY_E, ecodes.KEY_F, ecodes.KEY_G,
+    ecodes.KEY_H, ecodes.KEY_I, ecodes.KEY_J, ecodes.KEY_K, ecodes.KEY_L, ecodes.KEY_M, ecodes.KEY_N,
+    ecodes.KEY_O, ecodes.KEY_P, ecodes.KEY_Q, ecodes.KEY_R, ecodes.KEY_S, ecodes.KEY_T, ecodes.KEY_U,
+    ecodes.KEY_V, ecodes.KEY_W, ecodes.KEY_X, ecodes.KEY_Y, ecodes.KEY_Z,
+    ecodes.KEY_0, ecodes.KEY_1, ecodes.KEY_2, ecodes.KEY_3, ecodes.KEY_4,
+    ecodes.KEY_5, ecodes.KEY_6, ecodes.KEY_7, ecodes.KEY_8, ecodes.KEY_9,
+    ecodes.KEY_SPACE, ecodes.KEY_ENTER, ecodes.KEY_ESC, ecodes.KEY_TAB,
+    ecodes.KEY_LEFTSHIFT, ecodes.KEY_RIGHTSHIFT, ecodes.KEY_LEFTCTRL, ecodes.KEY_RIGHTCTRL,
+    ecodes.KEY_LEFTALT, ecodes.KEY_RIGHTALT,
+    ecodes.KEY_UP, ecodes.KEY_DOWN, ecodes.KEY_LEFT, ecodes.KEY_RIGHT,
+) + tuple(_FN2CODE[i] for i in range(1, 13))
+
+_UINPUT_EVENTS = {
+    ecodes.EV_KEY: list(_UINPUT_KEYS) + [ecodes.BTN_LEFT, ecodes.BTN_RIGHT],
+    ecodes.EV_REL: [ecodes.REL_X, ecodes.REL_Y, ecodes.REL_WHEEL],
+}
 
 
 def ensure_uinput() -> UInput:
-    # ざっくり “ゲームで使いがちなキー＋マウス” を許可
-    keys = [
-        ecodes.KEY_A, ecodes.KEY_B, ecodes.KEY_C, ecodes.KEY_D, ecodes.KEY_E, ecodes.KEY_F, ecodes.KEY_G,
-        ecodes.KEY_H, ecodes.KEY_I, ecodes.KEY_J, ecodes.KEY_K, ecodes.KEY_L, ecodes.KEY_M, ecodes.KEY_N,
-        ecodes.KEY_O, ecodes.KEY_P, ecodes.KEY_Q, ecodes.KEY_R, ecodes.KEY_S, ecodes.KEY_T, ecodes.KEY_U,
-        ecodes.KEY_V, ecodes.KEY_W, ecodes.KEY_X, ecodes.KEY_Y, ecodes.KEY_Z,
-        ecodes.KEY_0, ecodes.KEY_1, ecodes.KEY_2, ecodes.KEY_3, ecodes.KEY_4,
-        ecodes.KEY_5, ecodes.KEY_6, ecodes.KEY_7, ecodes.KEY_8, ecodes.KEY_9,
-        ecodes.KEY_SPACE, ecodes.KEY_ENTER, ecodes.KEY_ESC, ecodes.KEY_TAB,
-        ecodes.KEY_LEFTSHIFT, ecodes.KEY_RIGHTSHIFT, ecodes.KEY_LEFTCTRL, ecodes.KEY_RIGHTCTRL,
-        ecodes.KEY_LEFTALT, ecodes.KEY_RIGHTALT,
-        ecodes.KEY_UP, ecodes.KEY_DOWN, ecodes.KEY_LEFT, ecodes.KEY_RIGHT,
-    ] + [getattr(ecodes, f"KEY_F{i}") for i in range(1, 13)]
-
-    events = {
-        ecodes.EV_KEY: keys + [ecodes.BTN_LEFT, ecodes.BTN_RIGHT],
-        ecodes.EV_REL: [ecodes.REL_X, ecodes.REL_Y, ecodes.REL_WHEEL],
-    }
-    return UInput(events, name="macro-toggle-uinput", bustype=ecodes.BUS_USB)
-
-
-def _wait_with_pause(seconds: float, stop_event: threading.Event, run_event: threading.Event) -> None:
-    remaining = float(seconds)
-    tick = 0.05  # 50ms刻み（止めた時の反応を良くする）
-    while remaining > 0 and not stop_event.is_set():
-        # pause中は時間を減らさない
+    return UInput(_UINPUT_EVENTS, name="macro-toggle-uinput", bustype=ecodes.BUS_USB)
+
+
+async def _wait_with_pause(seconds: float, stop_event: asyncio.Event, run_event: asyncio.Event, state_evt: asyncio.Event) -> None:
+    # pause/resume/stop が state_evt.set() で起こすので、刻み無しで残り時間を丸ごと眠れる
+    deadline = time.monotonic() + float(seconds)
+    while not stop_event.is_set():
+        # pause中は時間を減らさない（止まっていた分だけ締め切りをずらす）
         if not run_event.is_set():
-            stop_event.wait(timeout=tick)
+            t0 = time.monotonic()
+            state_evt.clear()
+            await state_evt.wait()
+            deadline += time.monotonic() - t0
             continue
 
-        t0 = time.monotonic()
-        dt = min(tick, remaining)
-        if stop_event.wait(timeout=dt):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
             break
-        remaining -= (time.monotonic() - t0)
+        state_evt.clear()
+        try:
+            await asyncio.wait_for(state_evt.wait(), timeout=remaining)
+        except asyncio.TimeoutError:
+            pass
 
 
-def do_step(step: Dict[str, Any], stop_event: threading.Event, run_event: threading.Event, ui: UInput, hold: HoldState) -> None:
+# コンパイル済みステップの呼び出し形。
+# 同期ステップは None、waitのような待ちを伴うステップはコルーチンを返す
+StepFn = Callable[[asyncio.Event, asyncio.Event, asyncio.Event, UInput, HoldState], Optional[Awaitable[None]]]
+
+
+def _compile_step(step: Dict[str, Any]) -> StepFn:
+    """
+    Parse/validate a step once and return a closure with keycodes and
+    values already resolved. The hot loop in _run then just calls it —
+    no dict lookups or string compares per iteration.
+    """
     t = step.get("type")
 
     if t == "wait":
-        _wait_with_pause(float(step.get("seconds", 0)), stop_event, run_event)
-        return
+        sec = float(step.get("seconds", 0))
 
-    if stop_event.is_set():
-        return
+        def fn_wait(stop_event, run_event, state_evt, ui, hold):
+            return _wait_with_pause(sec, stop_event, run_event, state_evt)
+
+        return fn_wait
 
     if t == "key":
         code = parse_macro_key(str(step["key"]))
         action = str(step.get("action", "tap"))
+
         if action == "tap":
-            ui.write(ecodes.EV_KEY, code, 1)
-            ui.write(ecodes.EV_KEY, code, 0)
-            ui.syn()
-            return
+            buf = _pack_event(ecodes.EV_KEY, code, 1) + _pack_event(ecodes.EV_KEY, code, 0) + _SYN_EVENT
+
+            def fn_key_tap(stop_event, run_event, state_evt, ui, hold):
+                os.write(ui.fd, buf)
+
+            return fn_key_tap
+
         if action == "press":
-            ui.write(ecodes.EV_KEY, code, 1)
-            ui.syn()
-            hold.mark_down(code)
-            return
+            buf = _pack_event(ecodes.EV_KEY, code, 1) + _SYN_EVENT
+
+            def fn_key_press(stop_event, run_event, state_evt, ui, hold):
+                os.write(ui.fd, buf)
+                hold.mark_down(code)
+
+            return fn_key_press
+
         if action == "release":
-            ui.write(ecodes.EV_KEY, code, 0)
-            ui.syn()
-            hold.mark_up(code)
-            return
+            buf = _pack_event(ecodes.EV_KEY, code, 0) + _SYN_EVENT
+
+            def fn_key_release(stop_event, run_event, state_evt, ui, hold):
+                os.write(ui.fd, buf)
+                hold.mark_up(code)
+
+            return fn_key_release
+
         raise ValueError("key.action must be tap/press/release")
 
     if t == "combo":
-        raw_keys = [str(k) for k in step.get("keys", [])]
-        codes = [parse_macro_key(rk) for rk in raw_keys]
-        for c in codes:
-            ui.write(ecodes.EV_KEY, c, 1)
-        for c in reversed(codes):
-            ui.write(ecodes.EV_KEY, c, 0)
-        ui.syn()
-        return
+        codes = tuple(parse_macro_key(str(k)) for k in step.get("keys", []))
+        # press×N + release×N + SYN を事前に1本のバッファに詰め、書き込みは1回
+        buf = b"".join(
+            [_pack_event(ecodes.EV_KEY, c, 1) for c in codes]
+            + [_pack_event(ecodes.EV_KEY, c, 0) for c in reversed(codes)]
+        ) + _SYN_EVENT
+
+        def fn_combo(stop_event, run_event, state_evt, ui, hold):
+            os.write(ui.fd, buf)
+
+        return fn_combo
 
     if t == "mouse_click":
         button = str(step.get("button", "left"))
-        count = int(step.get("count", 1))
+        count = max(1, int(step.get("count", 1)))
         btn_code = ecodes.BTN_LEFT if button == "left" else ecodes.BTN_RIGHT
-        for _ in range(max(1, count)):
-            ui.write(ecodes.EV_KEY, btn_code, 1)
-            ui.write(ecodes.EV_KEY, btn_code, 0)
-            ui.syn()
-        return
+        # クリックごとにSYNを挟んだ連打バッファ（ダブルクリック判定が壊れないように）
+        buf = (
+            _pack_event(ecodes.EV_KEY, btn_code, 1)
+            + _pack_event(ecodes.EV_KEY, btn_code, 0)
+            + _SYN_EVENT
+        ) * count
+
+        def fn_mouse_click(stop_event, run_event, state_evt, ui, hold):
+            os.write(ui.fd, buf)
+
+        return fn_mouse_click
 
     if t == "mouse_button":
         button = str(step.get("button", "left"))
@@ -244,22 +360,30 @@ def do_step(step: Dict[str, Any], stop_event: threading.Event, run_event: thread
         btn_code = ecodes.BTN_LEFT if button == "left" else ecodes.BTN_RIGHT
 
         if action == "tap":
-            ui.write(ecodes.EV_KEY, btn_code, 1)
-            ui.write(ecodes.EV_KEY, btn_code, 0)
-            ui.syn()
-            return
+            buf = _pack_event(ecodes.EV_KEY, btn_code, 1) + _pack_event(ecodes.EV_KEY, btn_code, 0) + _SYN_EVENT
+
+            def fn_btn_tap(stop_event, run_event, state_evt, ui, hold):
+                os.write(ui.fd, buf)
+
+            return fn_btn_tap
 
         if action == "press":
-            ui.write(ecodes.EV_KEY, btn_code, 1)
-            ui.syn()
-            hold.mark_down(btn_code)  # 停止時に必ずreleaseされる
-            return
+            buf = _pack_event(ecodes.EV_KEY, btn_code, 1) + _SYN_EVENT
+
+            def fn_btn_press(stop_event, run_event, state_evt, ui, hold):
+                os.write(ui.fd, buf)
+                hold.mark_down(btn_code)  # 停止時に必ずreleaseされる
+
+            return fn_btn_press
 
         if action == "release":
-            ui.write(ecodes.EV_KEY, btn_code, 0)
-            ui.syn()
-            hold.mark_up(btn_code)
-            return
+            buf = _pack_event(ecodes.EV_KEY, btn_code, 0) + _SYN_EVENT
+
+            def fn_btn_release(stop_event, run_event, state_evt, ui, hold):
+                os.write(ui.fd, buf)
+                hold.mark_up(btn_code)
+
+            return fn_btn_release
 
         raise ValueError('mouse_button.action must be "tap"/"press"/"release"')
 
@@ -269,33 +393,131 @@ def do_step(step: Dict[str, Any], stop_event: threading.Event, run_event: thread
         y = int(step.get("y", 0))
         if mode != "relative":
             raise ValueError('mouse_move.mode is "relative" only in uinput version')
-        ui.write(ecodes.EV_REL, ecodes.REL_X, x)
-        ui.write(ecodes.EV_REL, ecodes.REL_Y, y)
-        ui.syn()
-        return
+
+        buf = b"".join(
+            _pack_event(ecodes.EV_REL, rc, v)
+            for rc, v in ((ecodes.REL_X, x), (ecodes.REL_Y, y))
+            if v != 0
+        ) + _SYN_EVENT
+
+        def fn_mouse_move(stop_event, run_event, state_evt, ui, hold):
+            os.write(ui.fd, buf)
+
+        return fn_mouse_move
 
     if t == "mouse_scroll":
         dy = int(step.get("dy", 0))
-        if dy != 0:
-            ui.write(ecodes.EV_REL, ecodes.REL_WHEEL, dy)
-            ui.syn()
-        return
+        buf = (_pack_event(ecodes.EV_REL, ecodes.REL_WHEEL, dy) + _SYN_EVENT) if dy != 0 else b""
+
+        def fn_mouse_scroll(stop_event, run_event, state_evt, ui, hold):
+            if buf:
+                os.write(ui.fd, buf)
+
+        return fn_mouse_scroll
 
     raise ValueError(f"Unknown step.type: {t}")
 
 
+def _fusible_emit(step: Dict[str, Any]) -> Optional[tuple]:
+    """
+    SYNを後続と共有できるステップなら (events, hold更新) を返す。
+    events は (type, code, value)、hold更新 は (code, down) のリスト。
+    wait / tap / 連打系は None（融合しない）。
+    """
+    t = step.get("type")
+
+    if t == "mouse_move":
+        if str(step.get("mode", "relative")) != "relative":
+            raise ValueError('mouse_move.mode is "relative" only in uinput version')
+        events = []
+        x = int(step.get("x", 0))
+        y = int(step.get("y", 0))
+        if x != 0:
+            events.append((ecodes.EV_REL, ecodes.REL_X, x))
+        if y != 0:
+            events.append((ecodes.EV_REL, ecodes.REL_Y, y))
+        return events, []
+
+    if t == "mouse_scroll":
+        dy = int(step.get("dy", 0))
+        return ([(ecodes.EV_REL, ecodes.REL_WHEEL, dy)] if dy != 0 else []), []
+
+    if t == "key":
+        action = str(step.get("action", "tap"))
+        if action in ("press", "release"):
+            code = parse_macro_key(str(step["key"]))
+            down = action == "press"
+            return [(ecodes.EV_KEY, code, 1 if down else 0)], [(code, down)]
+
+    return None
+
+
+def _compile_fused(events: List[tuple], holds: List[tuple]) -> StepFn:
+    buf = b"".join(_pack_event(*e) for e in events) + _SYN_EVENT
+    hold_updates = tuple(holds)
+
+    def fn_fused(stop_event, run_event, state_evt, ui, hold):
+        os.write(ui.fd, buf)
+        for code, down in hold_updates:
+            if down:
+                hold.mark_down(code)
+            else:
+                hold.mark_up(code)
+
+    return fn_fused
+
+
+def compile_macro(steps: List[Dict[str, Any]]) -> List[StepFn]:
+    """
+    ステップ列をコンパイルする。waitを挟まず連続する mouse_move /
+    mouse_scroll / key press/release は1つのSYN終端パケットに融合し、
+    カーネルが出すinputパケットを1回分にまとめる。
+    """
+    compiled: List[StepFn] = []
+    run_events: List[tuple] = []
+    run_holds: List[tuple] = []
+    run_len = 0
+
+    def flush() -> None:
+        nonlocal run_len
+        if run_len > 0:
+            compiled.append(_compile_fused(run_events, run_holds))
+            run_events.clear()
+            run_holds.clear()
+            run_len = 0
+
+    for step in steps:
+        parts = _fusible_emit(step)
+        if parts is None:
+            flush()
+            compiled.append(_compile_step(step))
+        else:
+            events, holds = parts
+            run_events.extend(events)
+            run_holds.extend(holds)
+            run_len += 1
+    flush()
+    return compiled
+
+
 def pick_keyboard_device(config: Dict[str, Any]) -> InputDevice:
     path = config.get("input_device")
     if path:
         return InputDevice(str(path))
 
-    # auto-pick: first device that looks like a keyboard
+    # auto-pick: まず by-id の *-event-kbd シンボリックリンクで即決
+    # （event*を全部開いてioctlする総当たりを避ける）
+    for p in sorted(glob.glob("/dev/input/by-id/*-event-kbd")):
+        return InputDevice(p)
+
+    # by-id が無い環境だけ従来の総当たり。外れたデバイスはfdを漏らさず閉じる
     for p in list_devices():
         dev = InputDevice(p)
         caps = dev.capabilities(verbose=False)
         keys = caps.get(ecodes.EV_KEY, [])
         if ecodes.KEY_A in keys and ecodes.KEY_LEFTCTRL in keys:
             return dev
+        dev.close()
 
     raise RuntimeError("Keyboard device not found. Set macros.json input_device to /dev/input/by-id/...-event-kbd")
 
@@ -304,6 +526,7 @@ class MacroTool:
     def __init__(self, config: Dict[str, Any]) -> None:
         self.loop = bool(config.get("loop", False))
         self.macro: List[Dict[str, Any]] = list(config.get("macro", []))
+        self.compiled: List[StepFn] = compile_macro(self.macro)
 
         self.trigger_spec = str(config.get("trigger_hotkey") or "").strip()
         self.quit_spec = str(config.get("quit_hotkey") or "").strip()
@@ -312,68 +535,76 @@ class MacroTool:
 
         self.trigger_req = parse_hotkey(self.trigger_spec)
         self.quit_req = parse_hotkey(self.quit_spec) if self.quit_spec else None
+        self._bit_of = keycode_bit_lut([self.trigger_req] + ([self.quit_req] if self.quit_req is not None else []))
+        self.trigger_masks = hotkey_masks(self.trigger_req, self._bit_of)
+        self.quit_masks = hotkey_masks(self.quit_req, self._bit_of) if self.quit_req is not None else None
 
-        self.stop_event = threading.Event()
-        self.run_event = threading.Event()  # set=実行, clear=一時停止
+        # listener と runner は同一イベントループ上のタスクなのでロック不要
+        self.stop_event = asyncio.Event()
+        self.run_event = asyncio.Event()  # set=実行, clear=一時停止
+        self._state_evt = asyncio.Event()  # 状態が変わったら実行タスクを起こす
+        self._quit_evt = asyncio.Event()
 
-        self.thread: Optional[threading.Thread] = None
-        self.lock = threading.Lock()
+        self.task: Optional[asyncio.Task] = None
 
         self.ui = ensure_uinput()
         self.hold = HoldState()
         self._paused_restore: List[int] = []
 
+        # listener の押下状態（ホットキー関連キーだけを詰めたビットマスク）
+        self._pressed = 0
+        self._trig_armed = True
+        self._quit_armed = True
+
         self.kbd = pick_keyboard_device(config)
 
     def is_running(self) -> bool:
-        return self.thread is not None and self.thread.is_alive()
+        return self.task is not None and not self.task.done()
 
     def is_paused(self) -> bool:
         return self.is_running() and (not self.run_event.is_set())
 
     def start(self) -> None:
-        with self.lock:
-            if self.is_running():
-                return
-            self.stop_event.clear()
-            self.run_event.set()
-            self._paused_restore.clear()
-            self.thread = threading.Thread(target=self._run, daemon=True)
-            self.thread.start()
-            print("[macro] started")
+        if self.is_running():
+            return
+        self.stop_event.clear()
+        self.run_event.set()
+        self._paused_restore.clear()
+        self.task = asyncio.get_running_loop().create_task(self._run())
+        print("[macro] started")
 
     def pause(self) -> None:
-        with self.lock:
-            if not self.is_running() or self.is_paused():
-                return
-            self.run_event.clear()
-            # 押しっぱなしキーがあれば即解除して、再開時に戻せるよう保存
-            self._paused_restore = self.hold.release_all_return(self.ui)
-            print("[macro] paused")
+        if not self.is_running() or self.is_paused():
+            return
+        self.run_event.clear()
+        self._state_evt.set()
+        # 押しっぱなしキーがあれば即解除して、再開時に戻せるよう保存
+        self._paused_restore = self.hold.release_all_return(self.ui)
+        print("[macro] paused")
 
     def resume(self) -> None:
-        with self.lock:
-            if not self.is_running() or not self.is_paused():
-                return
-            # pause時に押していたキーを押し直す
+        if not self.is_running() or not self.is_paused():
+            return
+        # pause時に押していたキーを押し直す
+        if self._paused_restore:
+            try:
+                os.writev(self.ui.fd, [_pack_event(ecodes.EV_KEY, c, 1) for c in self._paused_restore] + [_SYN_EVENT])
+            except Exception:
+                pass
             for c in self._paused_restore:
-                try:
-                    self.ui.write(ecodes.EV_KEY, c, 1)
-                    self.hold.mark_down(c)
-                except Exception:
-                    pass
-            self.ui.syn()
-            self._paused_restore.clear()
-            self.run_event.set()
-            print("[macro] resumed")
+                self.hold.mark_down(c)
+        self._paused_restore.clear()
+        self.run_event.set()
+        self._state_evt.set()
+        print("[macro] resumed")
 
     def stop(self) -> None:
         self.stop_event.set()
-        self.run_event.set()  # pause中でもスレッドが抜けられるように
+        self.run_event.set()  # pause中でもタスクが抜けられるように
+        self._state_evt.set()
         self.hold.release_all(self.ui)
-        with self.lock:
-            if self.is_running():
-                print("[macro] stopping...")
+        if self.is_running():
+            print("[macro] stopping...")
 
     def trigger(self) -> None:
         # trigger_hotkey：開始 → 一時停止 → 再開
@@ -387,67 +618,125 @@ class MacroTool:
     def request_quit(self) -> None:
         print("[macro] quitting...")
         self.stop()
-        raise SystemExit(0)
-
-    def _run(self) -> None:
+        self._quit_evt.set()
+
+    async def _wait_until_runnable(self) -> None:
+        # 実行中でも必ず一度ループへ制御を返す。同期ステップだけのマクロ
+        # （wait無しのloop設定など）でもリスナーのコールバックが動けるように
+        await asyncio.sleep(0)
+        # pause中はここで眠る（resume/stop の state_evt.set で即起きる）
+        while (not self.stop_event.is_set()) and (not self.run_event.is_set()):
+            self._state_evt.clear()
+            await self._state_evt.wait()
+
+    async def _run(self) -> None:
         try:
             if self.loop:
                 while not self.stop_event.is_set():
-                    while (not self.stop_event.is_set()) and (not self.run_event.is_set()):
-                        self.stop_event.wait(timeout=0.05)
+                    await self._wait_until_runnable()
 
-                    for step in self.macro:
+                    for fn in self.compiled:
                         if self.stop_event.is_set():
                             break
-                        while (not self.stop_event.is_set()) and (not self.run_event.is_set()):
-                            self.stop_event.wait(timeout=0.05)
+                        await self._wait_until_runnable()
                         if self.stop_event.is_set():
                             break
-                        do_step(step, self.stop_event, self.run_event, self.ui, self.hold)
+                        aw = fn(self.stop_event, self.run_event, self._state_evt, self.ui, self.hold)
+                        if aw is not None:
+                            await aw
             else:
-                for step in self.macro:
+                for fn in self.compiled:
                     if self.stop_event.is_set():
                         break
-                    while (not self.stop_event.is_set()) and (not self.run_event.is_set()):
-                        self.stop_event.wait(timeout=0.05)
+                    await self._wait_until_runnable()
                     if self.stop_event.is_set():
                         break
-                    do_step(step, self.stop_event, self.run_event, self.ui, self.hold)
+                    aw = fn(self.stop_event, self.run_event, self._state_evt, self.ui, self.hold)
+                    if aw is not None:
+                        await aw
         finally:
             self.hold.release_all(self.ui)
             print("[macro] stopped")
 
-    def listen_forever(self) -> None:
+    def _keyboard_lost(self, reason: str) -> None:
+        # fdを登録したままだとepollがEPOLLHUP/EPOLLERRをready扱いで報告し続けて
+        # 例外ログのスピンになるので、必ず外してから終了する
+        print(f"[macro] keyboard device lost ({reason})")
+        asyncio.get_running_loop().remove_reader(self.kbd.fd)
+        self.request_quit()
+
+    def _on_kbd_ready(self) -> None:
+        # 生の struct input_event をまとめ読みして自前でデコードする。
+        # evdev側の read() は1イベントごとにInputEventオブジェクトを作るが、
+        # ここで要るのは type/code/value の3整数だけ。判定はバッチ末尾で1回
+        pressed = self._pressed
+        bit_of = self._bit_of
+        fd = self.kbd.fd
+        while True:
+            try:
+                data = os.read(fd, 4096)  # fdはO_NONBLOCK（InputDeviceが開く）
+            except BlockingIOError:
+                break
+            except OSError as e:
+                # USB抜去などでデバイスが消えるとENODEVになる
+                self._keyboard_lost(str(e))
+                return
+            if not data:
+                self._keyboard_lost("EOF")
+                return
+            for _sec, _usec, etype, code, value in _INPUT_EVENT.iter_unpack(data):
+                if etype != ecodes.EV_KEY:
+                    continue
+
+                bit = bit_of[code]
+                if bit < 0:  # ホットキーに関係ないキー
+                    continue
+
+                # value: 1=down, 0=up, 2=repeat
+                if value == 1:
+                    pressed |= 1 << bit
+                elif value == 0:
+                    pressed &= ~(1 << bit)
+            if len(data) < 4096:
+                break
+
+        # ホットキーに関係するキーが動いていないバッチ（ゲーム中の大半）は判定まで行かない
+        if pressed == self._pressed:
+            return
+        self._pressed = pressed
+
+        # quit
+        if self.quit_masks is not None:
+            sat = hotkey_satisfied(pressed, self.quit_masks)
+            if sat and self._quit_armed:
+                self.request_quit()
+            self._quit_armed = not sat
+
+        # trigger (start/pause/resume)
+        sat = hotkey_satisfied(pressed, self.trigger_masks)
+        if sat and self._trig_armed:
+            self.trigger()
+        self._trig_armed = not sat
+
+    async def listen_forever(self) -> None:
         print(f"[macro] device={self.kbd.path} name={self.kbd.name}")
         print(f"[macro] trigger={self.trigger_spec} quit={self.quit_spec}")
-        print("[macro] listening (evdev)...")
-
-        pressed: set[int] = set()
-        trig_armed = True
-        quit_armed = True
-
-        for ev in self.kbd.read_loop():
-            if ev.type != ecodes.EV_KEY:
-                continue
-
-            # ev.value: 1=down, 0=up, 2=repeat
-            if ev.value == 1:
-                pressed.add(ev.code)
-            elif ev.value == 0:
-                pressed.discard(ev.code)
+        print("[macro] listening (evdev/asyncio)...")
 
-            # quit
-            if self.quit_req is not None:
-                sat = hotkey_satisfied(pressed, self.quit_req)
-                if sat and quit_armed:
-                    self.request_quit()
-                quit_armed = not sat
-
-            # trigger (start/pause/resume)
-            sat = hotkey_satisfied(pressed, self.trigger_req)
-            if sat and trig_armed:
-                self.trigger()
-            trig_armed = not sat
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.kbd.fd, self._on_kbd_ready)
+        try:
+            await self._quit_evt.wait()
+        finally:
+            loop.remove_reader(self.kbd.fd)
+            # Ctrl+C等でキャンセルされた場合もマクロを確実に止める
+            # （stopしないとloop/pause中のタスクが終わらず打鍵し続ける）
+            self.stop()
+            if self.task is not None:
+                try:
+                    await self.task
+                except asyncio.CancelledError:
+                    pass
 
 
 def main(argv: Optional[List[str]] = None) -> None:
@@ -468,9 +757,9 @@ def main(argv: Optional[List[str]] = None) -> None:
     config_path_str = args.config_flag or args.config
     config_path = Path(config_path_str) if config_path_str else DEFAULT_CONFIG_PATH
 
-    config = json.loads(config_path.read_text(encoding="utf-8"))
+    config = load_config(config_path)
     tool = MacroTool(config)
-    tool.listen_forever()
+    asyncio.run(tool.listen_forever())
 
 
 if __name__ == "__main__":